@@ -1,27 +1,273 @@
 """
 Jyväskylän tapahtumien haku ja kalenterin luonti GitHub Actionsille
+
+Käyttö:
+    python scripts/generate_calendar.py [fetch|render|all|batch] [--snapshot POLKU]
+
+    fetch   hakee tapahtumat lähteistä ja tallentaa ne välimuistitiedostoon
+    render  luo docs/-kansion sisällön välimuistitiedostosta ilman verkkoa
+    all     molemmat peräkkäin (oletus)
+    batch   generoi kaikki --batch-config-tiedoston kalenterit yhdellä ajolla
+
+Raskaat riippuvuudet (requests, feedparser, icalendar, bs4) tuodaan vasta
+kun niitä tarvitaan, joten render-vaihe ei lataa verkkokirjastoja lainkaan.
 """
 
-import requests
+import argparse
+import hashlib
 import json
 import os
-from datetime import datetime, timedelta
-from icalendar import Calendar, Event
-import feedparser
+import re
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
 from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+
+# Oletussäilytysikkuna: viikko taaksepäin, vuosi eteenpäin
+DEFAULT_RETENTION = {"past_days": 7, "future_days": 365}
+
+# Fetch-vaiheen tuottama normalisoitu tapahtumalista
+DEFAULT_SNAPSHOT_PATH = os.path.join("cache", "events_snapshot.json")
+
+# Muutoslokiin säilytettävien ajojen ja RSS-syötteen kohteiden enimmäismäärä
+CHANGELOG_MAX_RUNS = 50
+CHANGELOG_MAX_RSS_ITEMS = 100
+
+# Kentät, joiden muutokset raportoidaan muutossyötteessä. Lähde, otsikko ja
+# alkuaika kuuluvat tapahtuman tunnisteeseen (event_id), joten niiden muutos
+# näkyy poistuneena ja uutena tapahtumana eikä muuttuneena.
+TRACKED_FIELDS = ['description', 'end_date', 'location', 'url']
+
+# Usean kalenterin eräajon oletuskonfiguraatio
+DEFAULT_BATCH_CONFIG_PATH = os.path.join("config", "batch.json")
+
+# GitHub Pagesin juurikansio ja oletuskalenterin nimi
+PAGES_ROOT = "docs"
+DEFAULT_CALENDAR_NAME = "Jyväskylän Tapahtumat"
+
+# Tapahtumasuodattimen oletussäännöt. Konfiguraation "filters"-kohta täydentää
+# näitä: listat lisätään oletusten perään, muut arvot korvaavat oletukset ja
+# "remove"-kohdalla voi poistaa listoista oletussääntöjä.
+DEFAULT_FILTERS = {
+    "default": {
+        "keywords": ["menu", "navigation", "footer", "cookie", "sivusto"],
+        "regex": [],
+        "url_patterns": [],
+        "min_title_length": 3,
+        "max_title_length": None,
+        "min_description_length": 0
+    },
+    "sources": {
+        "https://kalenteri.jyvaskyla.fi": {
+            "min_title_length": 5,
+            "min_description_length": 21
+        }
+    }
+}
+
+# Suodatinsääntöjen nimet tyypeittäin
+FILTER_LIST_RULES = ['keywords', 'regex', 'url_patterns']
+FILTER_LIMIT_RULES = ['min_title_length', 'max_title_length', 'min_description_length']
+
+# Suodatinsääntöjen esikäsittelyn apulausekkeet: lausekkeen alun globaalit
+# liput sekä numeroidut ja nimetyt ryhmäviittaukset (\1, (?P=nimi), (?(1)...))
+GLOBAL_FLAGS_PATTERN = re.compile(r'\(\?([aiLmsux]+)\)')
+BACKREFERENCE_PATTERN = re.compile(r'(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?P=|\(\?\()')
+
+class EventFilter:
+    """Konfiguraatiosta käännetty tapahtumasuodatin
+
+    Avainsanat ja säännölliset lausekkeet yhdistetään yhdeksi lausekkeeksi,
+    jonka nimetystä ryhmästä nähdään mikä sääntö osui. Suodatin ajetaan heti
+    otsikon ja linkin löydyttyä, ennen päivämäärien ja kuvausten parsintaa,
+    ja hylkäykset lasketaan säännöittäin.
+    """
+
+    def __init__(self, rules):
+        self.signature = json.dumps(rules, sort_keys=True, ensure_ascii=False)
+        self.min_title_length = self.limit(rules, 'min_title_length') or 0
+        self.max_title_length = self.limit(rules, 'max_title_length')
+        self.min_description_length = self.limit(rules, 'min_description_length') or 0
+
+        self.title_matcher, self.title_rules = self.compile(
+            [(f"keyword:{keyword}", re.escape(str(keyword))) for keyword in rules.get('keywords', [])] +
+            [(f"regex:{pattern}", pattern) for pattern in rules.get('regex', [])]
+        )
+        self.url_matcher, self.url_rules = self.compile(
+            [(f"url:{pattern}", pattern) for pattern in rules.get('url_patterns', [])]
+        )
+
+        self.checked = 0
+        self.accepted = 0
+        self.rejections = Counter()
+
+    def limit(self, rules, name):
+        """Palauttaa pituusrajan kokonaislukuna, None jos rajaa ei ole asetettu"""
+        value = rules.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"suodattimen {name} ei ole kokonaisluku: {value!r}")
+
+    def compile(self, rules):
+        """Yhdistää säännöt yhdeksi lausekkeeksi, jossa jokaisella on oma nimetty ryhmä
+
+        Jokainen sääntö käännetään ensin erikseen, jotta virheellinen lauseke
+        näkyy selkeänä konfiguraatiovirheenä. Viittaukset toisiin ryhmiin eivät
+        toimi yhdistetyssä lausekkeessa, joten ne hylätään. Lausekkeen alussa
+        olevat liput, kuten (?i), muutetaan koskemaan vain omaa sääntöään.
+        """
+        if not rules:
+            return None, {}
+
+        names = {}
+        parts = []
+        for i, (label, regex) in enumerate(rules):
+            regex = self.prepare_rule(label, str(regex))
+            names[f"r{i}"] = label
+            parts.append(f"(?P<r{i}>{regex})")
+
+        return re.compile('|'.join(parts), re.IGNORECASE), names
+
+    def prepare_rule(self, label, regex):
+        """Tarkistaa yksittäisen säännön ja muuttaa sen yhdistettävään muotoon"""
+        try:
+            compiled = re.compile(regex)
+        except re.error as e:
+            raise ValueError(f"virheellinen suodatinsääntö {label}: {e}")
+
+        if compiled.groupindex:
+            raise ValueError(f"suodatinsääntö {label}: nimettyjä ryhmiä ei tueta")
+        if BACKREFERENCE_PATTERN.search(regex):
+            raise ValueError(f"suodatinsääntö {label}: ryhmäviittauksia (esim. \\1) ei tueta")
+
+        flags = GLOBAL_FLAGS_PATTERN.match(regex)
+        if flags:
+            body = regex[flags.end():]
+            # Verbose-tilassa rivin loppuun asti ulottuva kommentti ei saa niellä sulkevaa sulkua
+            if 'x' in flags.group(1):
+                body += '\n'
+            regex = f"(?{flags.group(1)}:{body})"
+
+        return regex
+
+    def match(self, title, url=None):
+        """Palauttaa hylkäävän säännön nimen tai None, jos tapahtuma kelpaa"""
+        if not title or len(title) < self.min_title_length:
+            return 'min_title_length'
+        if self.max_title_length is not None and len(title) > self.max_title_length:
+            return 'max_title_length'
+
+        if self.title_matcher:
+            match = self.title_matcher.search(title)
+            if match:
+                return self.title_rules[match.lastgroup]
+
+        if url and self.url_matcher:
+            match = self.url_matcher.search(url)
+            if match:
+                return self.url_rules[match.lastgroup]
+
+        return None
+
+    def check(self, title, url=None):
+        """Kuten match, mutta kirjaa tuloksen tilastoihin"""
+        self.checked += 1
+        rule = self.match(title, url)
+        if rule:
+            self.rejections[rule] += 1
+        else:
+            self.accepted += 1
+        return rule
+
+    def description(self, text):
+        """Palauttaa kuvauksen, jos se on vähintään vähimmäispituinen"""
+        text = text.strip()
+        return text if len(text) >= self.min_description_length else ''
+
+    def stats(self):
+        """Palauttaa suodattimen osumatilastot"""
+        return {
+            'checked': self.checked,
+            'accepted': self.accepted,
+            'rejected': dict(self.rejections.most_common())
+        }
+
+class SourceCache:
+    """Kalentereiden kesken jaettu HTTP-yhteys sekä haku- ja parsintavälimuisti
+
+    Eräajossa jokainen URL haetaan ja parsitaan vain kerran, vaikka sama lähde
+    olisi useamman kalenterin konfiguraatiossa.
+    """
 
-class GitHubCalendarGenerator:
     def __init__(self):
+        self.session = None
+        self.responses = {}
+        self.parsed = {}
+        self.filters = {}
+
+    def get(self, url, headers=None, timeout=15):
+        """Hakee URL:n jaetulla yhteydellä, virheet mukaan lukien vain kerran"""
+        if url not in self.responses:
+            import requests
+
+            if self.session is None:
+                self.session = requests.Session()
+            try:
+                self.responses[url] = self.session.get(url, headers=headers, timeout=timeout)
+            except Exception as e:
+                self.responses[url] = e
+
+        response = self.responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def events(self, key, parse):
+        """Palauttaa lähteen parsitut tapahtumat, parsien ne tarvittaessa
+
+        Palauttaa kopiot, jotta kalenterikohtaiset muutokset eivät vuoda
+        muille kalentereille. None tarkoittaa, ettei lähde ollut käytettävissä.
+        """
+        if key not in self.parsed:
+            self.parsed[key] = parse()
+
+        events = self.parsed[key]
+        if events is None:
+            return None
+        return [dict(event) for event in events]
+
+    def event_filter(self, source, rules):
+        """Palauttaa lähteen käännetyn suodattimen, jaettuna saman säännöstön kesken"""
+        key = (source, json.dumps(rules, sort_keys=True, ensure_ascii=False))
+        if key not in self.filters:
+            self.filters[key] = EventFilter(rules)
+        return self.filters[key]
+
+class GitHubCalendarGenerator:
+    def __init__(self, config_path=os.path.join("config", "urls.json"), docs_dir=PAGES_ROOT, sources=None,
+                 calendar_name=DEFAULT_CALENDAR_NAME):
         self.events = []
-        self.docs_dir = "docs"
-        self.config_dir = "config"
+        self.calendar_name = calendar_name
+        self.docs_dir = docs_dir
+        self.config_path = config_path
+        self.config_dir = os.path.dirname(config_path)
+        self.archive_dir = os.path.join(self.docs_dir, "archive")
+        self.sources = sources or SourceCache()
+        self.filters = {}
+        self.filter_stats = {}
         self.urls = self.load_urls()
 
     def load_urls(self):
         """Lataa URL-osoitteet config-tiedostosta"""
         try:
-            config_path = os.path.join(self.config_dir, 'urls.json')
-            os.makedirs(self.config_dir, exist_ok=True)
+            config_path = self.config_path
+            if self.config_dir:
+                os.makedirs(self.config_dir, exist_ok=True)
             
             if not os.path.exists(config_path):
                 default_urls = {
@@ -32,21 +278,257 @@ class GitHubCalendarGenerator:
                     ],
                     "api_endpoints": [
                         "https://kalenteri.jyvaskyla.fi/api/events"
-                    ]
+                    ],
+                    "retention": dict(DEFAULT_RETENTION)
                 }
                 with open(config_path, 'w', encoding='utf-8') as f:
                     json.dump(default_urls, f, indent=4, ensure_ascii=False)
-                return default_urls
-                
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                urls = default_urls
+            else:
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    urls = json.load(f)
         except Exception as e:
             print(f"⚠️ Virhe URL-konfiguraation lataamisessa: {e}")
-            return {"rss_feeds": [], "scrape_urls": [], "api_endpoints": []}
+            urls = {"rss_feeds": [], "scrape_urls": [], "api_endpoints": []}
+        
+        urls['retention'] = self.validate_retention(urls.get('retention'))
+        return urls
+
+    def validate_retention(self, retention):
+        """Tarkistaa säilytysikkunan asetukset, virheellisillä käytetään oletuksia"""
+        if retention is None:
+            return dict(DEFAULT_RETENTION)
+
+        try:
+            if not isinstance(retention, dict):
+                raise ValueError("pitää olla JSON-objekti")
+            validated = dict(DEFAULT_RETENTION)
+            for name, value in retention.items():
+                if name not in DEFAULT_RETENTION:
+                    raise ValueError(f"tuntematon asetus {name}")
+                if isinstance(value, bool):
+                    raise ValueError(f"{name} ei ole kokonaisluku")
+                validated[name] = int(value)
+                if validated[name] < 0:
+                    raise ValueError(f"{name} ei voi olla negatiivinen")
+            return validated
+        except (TypeError, ValueError) as e:
+            print(f"⚠️ Virheellinen retention-asetus ({e}), käytetään oletuksia {DEFAULT_RETENTION}")
+            return dict(DEFAULT_RETENTION)
 
     def ensure_docs_dir(self):
         """Varmistaa että docs-kansio on olemassa"""
         os.makedirs(self.docs_dir, exist_ok=True)
+
+    def event_filter(self, source):
+        """Palauttaa lähteen suodattimen oletus- ja konfiguraatiosääntöjen pohjalta"""
+        if source not in self.filters:
+            config = self.urls.get('filters') or {}
+            if not isinstance(config, dict):
+                raise ValueError("'filters' pitää olla JSON-objekti")
+            source_configs = config.get('sources') or {}
+            if not isinstance(source_configs, dict):
+                raise ValueError("'filters.sources' pitää olla JSON-objekti")
+
+            rules = dict(DEFAULT_FILTERS['default'])
+            # Sisäänrakennetut kerrokset ensin, jotta konfiguraatio voittaa aina
+            for overrides in [DEFAULT_FILTERS['sources'].get(source, {}),
+                              config.get('default') or {},
+                              source_configs.get(source) or {}]:
+                self.merge_filter_rules(rules, overrides)
+            self.filters[source] = self.sources.event_filter(source, rules)
+        return self.filters[source]
+
+    def merge_filter_rules(self, rules, overrides):
+        """Yhdistää yhden sääntökerroksen aiempiin ja tarkistaa sääntöjen tyypit"""
+        if not isinstance(overrides, dict):
+            raise ValueError(f"suodatinkerroksen pitää olla JSON-objekti: {overrides!r}")
+
+        def string_list(name, value):
+            if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                raise ValueError(f"suodattimen {name} pitää olla lista merkkijonoja: {value!r}")
+            return value
+
+        for name, value in overrides.items():
+            if name == 'remove':
+                if not isinstance(value, dict):
+                    raise ValueError(f"suodattimen remove pitää olla objekti, esim. {{'keywords': [...]}}: {value!r}")
+                for list_name, removed in value.items():
+                    if list_name not in FILTER_LIST_RULES:
+                        raise ValueError(f"tuntematon poistettava suodatinlista: {list_name}")
+                    removed = string_list(f"remove.{list_name}", removed)
+                    rules[list_name] = [item for item in rules.get(list_name, []) if item not in removed]
+            elif name in FILTER_LIST_RULES:
+                rules[name] = list(rules.get(name, [])) + string_list(name, value)
+            elif name in FILTER_LIMIT_RULES:
+                if value is not None and (isinstance(value, bool) or not isinstance(value, (int, str))):
+                    raise ValueError(f"suodattimen {name} pitää olla kokonaisluku: {value!r}")
+                rules[name] = value
+            else:
+                raise ValueError(f"tuntematon suodatinsääntö: {name}")
+
+    def retention_window(self, now=None):
+        """Palauttaa säilytysikkunan alku- ja loppuhetken"""
+        retention = self.urls['retention']
+        now = now or datetime.now()
+        return (now - timedelta(days=retention['past_days']),
+                now + timedelta(days=retention['future_days']))
+
+    def to_local_naive(self, value):
+        """Muuntaa aikavyöhykkeellisen ajan paikalliseksi naiiviksi ajaksi vertailuja varten"""
+        if value is None or value.tzinfo is None:
+            return value
+        return value.astimezone().replace(tzinfo=None)
+
+    def event_id(self, event):
+        """Palauttaa tapahtumalle pysyvän tunnisteen lähteen, otsikon ja alkuajan perusteella
+
+        Aikavyöhykkeelliset ajat muunnetaan UTC:hen eikä koneen paikalliseen
+        aikaan, jotta tunniste on sama kaikissa ajoympäristöissä.
+        """
+        start_date = event.get('start_date')
+        if start_date is not None and start_date.tzinfo is not None:
+            start_date = start_date.astimezone(timezone.utc)
+        key = '|'.join([
+            event.get('source', ''),
+            event['title'],
+            start_date.isoformat() if start_date else ''
+        ])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+    def serialize_event(self, event):
+        """Muuntaa tapahtuman JSON-muotoon"""
+        return {
+            'id': self.event_id(event),
+            'title': event['title'],
+            'description': event.get('description', ''),
+            'start_date': event['start_date'].isoformat() if event.get('start_date') else None,
+            'end_date': event['end_date'].isoformat() if event.get('end_date') else None,
+            'location': event.get('location', ''),
+            'url': event.get('url', ''),
+            'source': event.get('source', '')
+        }
+
+    def deserialize_event(self, data):
+        """Muuntaa JSON-muotoisen tapahtuman takaisin sisäiseen muotoon"""
+        event = dict(data)
+        event.pop('id', None)
+        for field in ['start_date', 'end_date']:
+            if event.get(field):
+                event[field] = datetime.fromisoformat(event[field])
+            else:
+                event.pop(field, None)
+        return event
+
+    def load_events_json(self, path):
+        """Lataa tapahtumat aiemmin tallennetusta JSON-tiedostosta"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data, [self.deserialize_event(e) for e in data.get('events', [])]
+        except FileNotFoundError:
+            return {}, []
+        except Exception as e:
+            print(f"⚠️ Virhe tiedoston {path} lukemisessa: {e}")
+            return {}, []
+
+    def apply_retention(self, previous_events):
+        """Karsii tapahtumat säilytysikkunan ulkopuolelta ja arkistoi menneet
+
+        Palauttaa arkistoon siirretyt tapahtumat.
+        """
+        window_start, window_end = self.retention_window()
+
+        live_events = []
+        expired_events = []
+        for event in self.events:
+            start_date = self.to_local_naive(event.get('start_date'))
+            if start_date is None or window_start <= start_date <= window_end:
+                live_events.append(event)
+            elif start_date < window_start:
+                expired_events.append(event)
+
+        # Edellisen ajon tapahtumat, jotka ovat sittemmin vanhentuneet, arkistoidaan
+        for event in previous_events:
+            start_date = self.to_local_naive(event.get('start_date'))
+            if start_date is not None and start_date < window_start:
+                expired_events.append(event)
+
+        pruned = len(self.events) - len(live_events)
+        self.events = live_events
+        self.archive_events(expired_events, window_start)
+
+        if pruned:
+            print(f"🧹 Karsittiin {pruned} tapahtumaa säilytysikkunan ulkopuolelta")
+
+        return expired_events
+
+    def archive_events(self, expired_events, window_start):
+        """Siirtää vanhentuneet tapahtumat vuosikohtaisiin arkistotiedostoihin
+
+        Vanhentuneet tapahtumat kerätään ensin välitiedostoon archive/pending.json.
+        Vuoden arkisto kirjoitetaan kerran, kun vuosi on kokonaan
+        säilytysikkunan takana, eikä valmiita arkistoja enää avata tai muuteta.
+        """
+        pending_path = os.path.join(self.archive_dir, 'pending.json')
+        pending = []
+        if os.path.exists(pending_path):
+            # Rikkinäistä välitiedostoa ei ylikirjoiteta, ettei kerättyjä tapahtumia menetetä
+            try:
+                with open(pending_path, 'r', encoding='utf-8') as f:
+                    pending = [self.deserialize_event(event) for event in json.load(f)['events']]
+            except Exception as e:
+                print(f"❌ Arkiston välitiedoston {pending_path} lukeminen epäonnistui, arkistointi ohitetaan: {e}")
+                return
+
+        pending_ids = {self.event_id(event) for event in pending}
+        added = 0
+        for event in expired_events:
+            event_id = self.event_id(event)
+            if event_id not in pending_ids:
+                pending_ids.add(event_id)
+                pending.append(event)
+                added += 1
+
+        def event_year(event):
+            return self.to_local_naive(event['start_date']).year
+
+        closed_years = sorted({event_year(event) for event in pending if event_year(event) < window_start.year})
+        for year in closed_years:
+            events = sorted([event for event in pending if event_year(event) == year],
+                            key=lambda x: self.to_local_naive(x['start_date']))
+            if os.path.exists(os.path.join(self.archive_dir, f'{year}.json')):
+                print(f"ℹ️ Arkisto {year} on jo valmis, sen vuoden {len(events)} tapahtumaa ohitetaan")
+            else:
+                self.write_archive(year, events)
+                print(f"🗄️ Arkisto {year} kirjoitettu: {len(events)} tapahtumaa")
+            pending = [event for event in pending if event_year(event) != year]
+
+        if added or closed_years:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            pending.sort(key=lambda x: self.to_local_naive(x['start_date']))
+            with open(pending_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'updated': datetime.now().isoformat(),
+                    'count': len(pending),
+                    'events': [self.serialize_event(event) for event in pending]
+                }, f, ensure_ascii=False, indent=2)
+
+    def write_archive(self, year, events):
+        """Kirjoittaa vuoden arkiston ICS- ja JSON-muodossa"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        ical_content = self.generate_ical(events, calname=f'{self.calendar_name} {year} (arkisto)')
+        with open(os.path.join(self.archive_dir, f'{year}.ics'), 'wb') as f:
+            f.write(ical_content)
+
+        with open(os.path.join(self.archive_dir, f'{year}.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'year': year,
+                'created': datetime.now().isoformat(),
+                'count': len(events),
+                'events': [self.serialize_event(event) for event in events]
+            }, f, ensure_ascii=False, indent=2)
         
     def fetch_events_from_sources(self):
         """Hakee tapahtumat eri lähteistä"""
@@ -63,36 +545,33 @@ class GitHubCalendarGenerator:
         
         print(f"✅ Löydettiin {len(self.events)} tapahtumaa")
         
+        self.filter_stats = {source: event_filter.stats() for source, event_filter in self.filters.items()}
+        for source, stats in self.filter_stats.items():
+            if stats['rejected']:
+                top = ', '.join(f"{rule} ({count})" for rule, count in list(stats['rejected'].items())[:3])
+                print(f"🚫 {source}: hylättiin {stats['checked'] - stats['accepted']}/{stats['checked']} - {top}")
+        
     def fetch_jyvaskyla_official(self):
         """Hakee tapahtumat Jyväskylän virallisesta kalenterista"""
         try:
             print("🏛️ Haetaan Jyväskylän virallisesta kalenterista...")
             
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (compatible; JKLEventsBot/1.0)',
-                'Accept': 'application/json, text/html'
-            }
-            
             # Käytä konfiguraatiosta ladattuja API-endpointteja
             for api_url in self.urls.get('api_endpoints', []):
                 try:
-                    response = requests.get(api_url, headers=headers, timeout=10)
-                    if response.status_code == 200:
-                        try:
-                            data = response.json()
-                            events_data = data if isinstance(data, list) else data.get('events', data.get('data', []))
-                            
-                            for event_item in events_data:
-                                event = self.parse_jyvaskyla_event(event_item)
-                                if event:
-                                    self.events.append(event)
-                            
-                            print(f"✅ API {api_url} toimii - löydettiin tapahtumia")
-                            return
-                        except:
-                            continue
+                    event_filter = self.event_filter(api_url)
+                except ValueError as e:
+                    print(f"❌ API {api_url} ohitetaan, virheellinen suodatin: {e}")
+                    continue
+                try:
+                    events = self.sources.events(('api', api_url, event_filter.signature),
+                                                 lambda: self.parse_api_endpoint(api_url, event_filter))
                 except:
                     continue
+                if events is not None:
+                    self.events.extend(events)
+                    print(f"✅ API {api_url} toimii - löydettiin tapahtumia")
+                    return
             
             # Jos API:t eivät toimi, scrapaa pääsivu
             self.scrape_jyvaskyla_official()
@@ -100,7 +579,31 @@ class GitHubCalendarGenerator:
         except Exception as e:
             print(f"❌ Jyväskylän virallisen kalenterin haku epäonnistui: {e}")
     
-    def parse_jyvaskyla_event(self, event_data):
+    def parse_api_endpoint(self, api_url, event_filter):
+        """Hakee ja parsii yhden API-endpointin, None jos endpoint ei toimi"""
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (compatible; JKLEventsBot/1.0)',
+            'Accept': 'application/json, text/html'
+        }
+        
+        response = self.sources.get(api_url, headers=headers, timeout=10)
+        if response.status_code != 200:
+            return None
+        
+        try:
+            data = response.json()
+        except ValueError:
+            return None
+        events_data = data if isinstance(data, list) else data.get('events', data.get('data', []))
+        
+        events = []
+        for event_item in events_data:
+            event = self.parse_jyvaskyla_event(event_item, event_filter)
+            if event:
+                events.append(event)
+        return events
+    
+    def parse_jyvaskyla_event(self, event_data, event_filter):
         """Parsii Jyväskylän virallisen kalenterin tapahtuman"""
         try:
             if not isinstance(event_data, dict):
@@ -113,7 +616,7 @@ class GitHubCalendarGenerator:
                     title = str(event_data[field]).strip()
                     break
             
-            if not title:
+            if event_filter.check(title):
                 return None
             
             event = {
@@ -127,7 +630,7 @@ class GitHubCalendarGenerator:
             # Kuvaus
             for field in ['description', 'kuvaus', 'content', 'details']:
                 if field in event_data and event_data[field]:
-                    event['description'] = str(event_data[field]).strip()
+                    event['description'] = event_filter.description(str(event_data[field]))
                     break
             
             # Päivämäärä
@@ -161,135 +664,124 @@ class GitHubCalendarGenerator:
     def scrape_jyvaskyla_official(self):
         """Scrapaa kalenteri.jyvaskyla.fi sivua"""
         try:
-            headers = {'User-Agent': 'Mozilla/5.0 (compatible; JKLEventsBot/1.0)'}
-            response = requests.get('https://kalenteri.jyvaskyla.fi', headers=headers, timeout=15)
-            
-            if response.status_code == 200:
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Etsi tapahtuma-elementtejä
-                event_elements = soup.select('.event, .tapahtuma, article, .item, [data-event]')
-                
-                for element in event_elements:
-                    try:
-                        # Etsi otsikko
-                        title_elem = element.select_one('h1, h2, h3, h4, .title, .otsikko, a')
-                        if not title_elem:
-                            continue
-                        
-                        title = title_elem.get_text().strip()
-                        if len(title) < 5:
-                            continue
-                        
-                        event = {
-                            'title': f"🏛️ {title}",
-                            'description': '',
-                            'location': 'Jyväskylä',
-                            'url': 'https://kalenteri.jyvaskyla.fi',
-                            'source': 'Jyväskylän kaupunki'
-                        }
-                        
-                        # Etsi päivämäärä
-                        date_elem = element.select_one('time, .date, .pvm')
-                        if date_elem:
-                            date_text = date_elem.get('datetime') or date_elem.get_text()
-                            event['start_date'] = self.parse_date(date_text)
-                        
-                        # Etsi kuvaus
-                        desc_elem = element.select_one('.description, .kuvaus, p')
-                        if desc_elem:
-                            desc = desc_elem.get_text().strip()
-                            if len(desc) > 20:
-                                event['description'] = desc
-                        
-                        # Etsi linkki
-                        link_elem = element.select_one('a[href]')
-                        if link_elem:
-                            href = link_elem.get('href')
-                            if href and href.startswith('/'):
-                                event['url'] = 'https://kalenteri.jyvaskyla.fi' + href
-                        
-                        if self.is_valid_event(event):
-                            self.events.append(event)
-                    
-                    except Exception as e:
-                        continue
-                
+            url = 'https://kalenteri.jyvaskyla.fi'
+            event_filter = self.event_filter(url)
+            events = self.sources.events(('official', url, event_filter.signature),
+                                         lambda: self.parse_official_page(url, event_filter))
+            if events is not None:
+                self.events.extend(events)
                 print(f"✅ Scrapattiin kalenteri.jyvaskyla.fi - löydettiin tapahtumia")
                 
         except Exception as e:
             print(f"❌ kalenteri.jyvaskyla.fi scraping epäonnistui: {e}")
     
-    def is_valid_event(self, event):
-        """Tarkistaa onko tapahtuma validi"""
-        if not event.get('title') or len(event['title']) < 5:
-            return False
+    def parse_official_page(self, url, event_filter):
+        """Parsii kalenteri.jyvaskyla.fi -sivun tapahtumat, None jos sivu ei vastaa"""
+        headers = {'User-Agent': 'Mozilla/5.0 (compatible; JKLEventsBot/1.0)'}
+        response = self.sources.get(url, headers=headers, timeout=15)
         
-        # Suodata pois navigaatio yms.
-        invalid_keywords = ['menu', 'navigation', 'footer', 'cookie', 'sivusto']
-        title_lower = event['title'].lower()
+        if response.status_code != 200:
+            return None
         
-        for keyword in invalid_keywords:
-            if keyword in title_lower:
-                return False
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(response.content, 'html.parser')
         
-        return True
+        events = []
+        
+        # Etsi tapahtuma-elementtejä
+        event_elements = soup.select('.event, .tapahtuma, article, .item, [data-event]')
+        
+        for element in event_elements:
+            try:
+                # Etsi otsikko
+                title_elem = element.select_one('h1, h2, h3, h4, .title, .otsikko, a')
+                if not title_elem:
+                    continue
+                
+                title = title_elem.get_text().strip()
+                link_elem = element.select_one('a[href]')
+                href = link_elem.get('href') if link_elem else None
+                if event_filter.check(title, href):
+                    continue
+                
+                event = {
+                    'title': f"🏛️ {title}",
+                    'description': '',
+                    'location': 'Jyväskylä',
+                    'url': 'https://kalenteri.jyvaskyla.fi',
+                    'source': 'Jyväskylän kaupunki'
+                }
+                
+                # Etsi päivämäärä
+                date_elem = element.select_one('time, .date, .pvm')
+                if date_elem:
+                    date_text = date_elem.get('datetime') or date_elem.get_text()
+                    event['start_date'] = self.parse_date(date_text)
+                
+                # Etsi kuvaus
+                desc_elem = element.select_one('.description, .kuvaus, p')
+                if desc_elem:
+                    event['description'] = event_filter.description(desc_elem.get_text())
+                
+                # Linkki
+                if href and href.startswith('/'):
+                    event['url'] = 'https://kalenteri.jyvaskyla.fi' + href
+                
+                events.append(event)
+                
+            except Exception as e:
+                continue
+        
+        return events
     
     def fetch_rss_events(self):
         """Hakee tapahtumat RSS-syötteistä"""
         for feed_url in self.urls.get('rss_feeds', []):
             try:
-                feed = feedparser.parse(feed_url)
-                for entry in feed.entries:
-                    self.events.append({
-                        'title': entry.get('title', 'Nimetön tapahtuma'),
-                        'description': entry.get('summary', ''),
-                        'start_date': self.parse_date(entry.get('published')),
-                        'location': 'Jyväskylä',
-                        'url': entry.get('link', ''),
-                        'source': 'RSS Feed'
-                    })
+                event_filter = self.event_filter(feed_url)
+                events = self.sources.events(('rss', feed_url, event_filter.signature),
+                                             lambda: self.parse_rss_feed(feed_url, event_filter))
+                self.events.extend(events)
                 print(f"✅ RSS-syöte haettu: {feed_url}")
             except Exception as e:
                 print(f"❌ RSS-syöte {feed_url} epäonnistui: {e}")
 
+    def parse_rss_feed(self, feed_url, event_filter):
+        """Hakee ja parsii yhden RSS-syötteen"""
+        import feedparser
+
+        response = self.sources.get(feed_url, headers={'User-Agent': 'Mozilla/5.0 (compatible; JKLEventsBot/1.0)'})
+        feed = feedparser.parse(response.content)
+
+        events = []
+        for entry in feed.entries:
+            title = entry.get('title', 'Nimetön tapahtuma')
+            if event_filter.check(title, entry.get('link')):
+                continue
+            events.append({
+                'title': title,
+                'description': event_filter.description(entry.get('summary', '')),
+                'start_date': self.parse_date(entry.get('published')),
+                'location': 'Jyväskylä',
+                'url': entry.get('link', ''),
+                'source': 'RSS Feed'
+            })
+        return events
+
     def fetch_jyvaskyla_events(self):
         """Hakee tapahtumat Jyväskylän sivuilta (scraping)"""
         try:
-            headers = {'User-Agent': 'Mozilla/5.0 (compatible; JyvaskylaEventsBot/1.0)'}
-            
             # Käytä konfiguraatiosta ladattuja scrape-URLeja
             for url in self.urls.get('scrape_urls', []):
                 try:
                     print(f"🔍 Haetaan tapahtumia: {url}")
-                    response = requests.get(url, headers=headers, timeout=15)
+                    event_filter = self.event_filter(url)
+                    events = self.sources.events(('scrape', url, event_filter.signature),
+                                                 lambda: self.scrape_events_page(url, event_filter))
                     
-                    if response.status_code == 200:
-                        from bs4 import BeautifulSoup
-                        soup = BeautifulSoup(response.content, 'html.parser')
-                        
-                        # Yleisiä tapahtuma-containereiden luokkia
-                        event_selectors = [
-                            '.event-item',
-                            '.event-list',
-                            '.tapahtuma',
-                            '.event-container',
-                            'article',
-                            '.calendar-event',
-                            '[data-type="event"]'
-                        ]
-                        
-                        for selector in event_selectors:
-                            events = soup.select(selector)
-                            if events:
-                                for event_elem in events:
-                                    event = self.parse_scraped_event(event_elem, base_url=url)
-                                    if event and self.is_valid_event(event):
-                                        self.events.append(event)
-                                
-                                print(f"✅ Löydettiin tapahtumia: {url}")
-                                break
+                    if events:
+                        self.events.extend(events)
+                        print(f"✅ Löydettiin tapahtumia: {url}")
                     
                 except Exception as e:
                     print(f"⚠️ Virhe scrapattaessa {url}: {e}")
@@ -298,7 +790,41 @@ class GitHubCalendarGenerator:
         except Exception as e:
             print(f"❌ Tapahtumien haku epäonnistui: {e}")
     
-    def parse_scraped_event(self, event_elem, base_url):
+    def scrape_events_page(self, url, event_filter):
+        """Hakee ja parsii yhden tapahtumasivun, None jos sivu ei vastaa"""
+        headers = {'User-Agent': 'Mozilla/5.0 (compatible; JyvaskylaEventsBot/1.0)'}
+        response = self.sources.get(url, headers=headers, timeout=15)
+        
+        if response.status_code != 200:
+            return None
+        
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(response.content, 'html.parser')
+        
+        # Yleisiä tapahtuma-containereiden luokkia
+        event_selectors = [
+            '.event-item',
+            '.event-list',
+            '.tapahtuma',
+            '.event-container',
+            'article',
+            '.calendar-event',
+            '[data-type="event"]'
+        ]
+        
+        events = []
+        for selector in event_selectors:
+            elements = soup.select(selector)
+            if elements:
+                for event_elem in elements:
+                    event = self.parse_scraped_event(event_elem, base_url=url, event_filter=event_filter)
+                    if event:
+                        events.append(event)
+                break
+        
+        return events
+    
+    def parse_scraped_event(self, event_elem, base_url, event_filter):
         """Parsii scrapattua tapahtumaa"""
         try:
             # Etsi otsikko
@@ -307,7 +833,10 @@ class GitHubCalendarGenerator:
             if title_elem:
                 title = title_elem.get_text().strip()
             
-            if not title or len(title) < 3:
+            url_elem = event_elem.select_one('a[href]')
+            href = url_elem.get('href', '') if url_elem else ''
+            
+            if event_filter.check(title, href):
                 return None
                 
             event = {
@@ -339,7 +868,7 @@ class GitHubCalendarGenerator:
             # Etsi kuvaus
             desc_elem = event_elem.select_one('.description, .content, .event-description, p')
             if desc_elem:
-                event['description'] = desc_elem.get_text().strip()
+                event['description'] = event_filter.description(desc_elem.get_text())
                 
             # Etsi paikka
             location_elem = event_elem.select_one('.location, .place, .venue, .event-location')
@@ -348,15 +877,12 @@ class GitHubCalendarGenerator:
                 if location:
                     event['location'] = location
                     
-            # Etsi URL
-            url_elem = event_elem.select_one('a[href]')
-            if url_elem:
-                href = url_elem.get('href', '')
-                if href:
-                    if href.startswith('/'):
-                        event['url'] = urljoin(base_url, href)
-                    elif href.startswith('http'):
-                        event['url'] = href
+            # URL
+            if href:
+                if href.startswith('/'):
+                    event['url'] = urljoin(base_url, href)
+                elif href.startswith('http'):
+                    event['url'] = href
                         
             return event
             
@@ -365,9 +891,13 @@ class GitHubCalendarGenerator:
             return None
     
     def parse_date(self, date_str):
-        """Parsii päivämäärän"""
+        """Parsii päivämäärän, None jos päivämäärää ei tunnisteta
+
+        Tuntematonta aikaa ei korvata arvauksella, jotta tapahtuman tunniste
+        (event_id) pysyy samana ajosta toiseen.
+        """
         if not date_str:
-            return datetime.now() + timedelta(days=1)
+            return None
             
         formats = [
             '%Y-%m-%d %H:%M:%S',
@@ -383,20 +913,27 @@ class GitHubCalendarGenerator:
             except (ValueError, AttributeError):
                 continue
         
-        return datetime.now() + timedelta(days=1)
+        return None
     
-    def generate_ical(self):
+    def generate_ical(self, events=None, calname=None):
         """Luo iCalendar-tiedosto"""
+        from icalendar import Calendar, Event
+
+        if events is None:
+            events = self.events
+        if calname is None:
+            calname = self.calendar_name
+
         cal = Calendar()
         cal.add('prodid', '-//Jyväskylän Tapahtumakalenteri//GitHub//')
         cal.add('version', '2.0')
         cal.add('calscale', 'GREGORIAN')
         cal.add('method', 'PUBLISH')
-        cal.add('x-wr-calname', 'Jyväskylän Tapahtumat')
+        cal.add('x-wr-calname', calname)
         cal.add('x-wr-caldesc', 'Ajankohtaiset tapahtumat Jyväskylän alueelta - Päivittyy automaattisesti')
         cal.add('x-wr-timezone', 'Europe/Helsinki')
         
-        for event_data in self.events:
+        for event_data in events:
             event = Event()
             event.add('summary', event_data['title'])
             
@@ -409,15 +946,15 @@ class GitHubCalendarGenerator:
             
             event.add('description', description)
             
-            start_date = event_data.get('start_date')
-            if start_date:
-                event.add('dtstart', start_date)
-                
-                end_date = event_data.get('end_date')
-                if end_date:
-                    event.add('dtend', end_date)
-                else:
-                    event.add('dtend', start_date + timedelta(hours=2))
+            # Kalenterisovellukset vaativat alkuajan, joten tuntematon aika näytetään huomisena
+            start_date = event_data.get('start_date') or datetime.now() + timedelta(days=1)
+            event.add('dtstart', start_date)
+            
+            end_date = event_data.get('end_date')
+            if end_date:
+                event.add('dtend', end_date)
+            else:
+                event.add('dtend', start_date + timedelta(hours=2))
             
             event.add('location', event_data.get('location', 'Jyväskylä'))
             
@@ -425,7 +962,7 @@ class GitHubCalendarGenerator:
                 event.add('url', event_data['url'])
             
             # Uniikki ID
-            uid = f"{abs(hash(event_data['title'] + str(start_date)))}@jyvaskyla-events.github.io"
+            uid = f"{self.event_id(event_data)}@jyvaskyla-events.github.io"
             event.add('uid', uid)
             
             event.add('dtstamp', datetime.now())
@@ -438,22 +975,21 @@ class GitHubCalendarGenerator:
         """Luo HTML-sivu kalenterin tilaamiseen"""
         
         repo_name = os.environ.get('GITHUB_REPOSITORY', 'käyttäjä/jyvaskyla-tapahtumat')
-        username = repo_name.split('/')[0]
         
-        calendar_url = f"https://{username}.github.io/jyvaskyla-tapahtumat/calendar.ics"
+        calendar_url = f"{self.pages_url()}calendar.ics"
         
-        # Järjestä tapahtumat päivämäärän mukaan
+        # Järjestä tapahtumat päivämäärän mukaan, tuntemattomat ajat viimeisiksi
         sorted_events = sorted(
             [e for e in self.events if e.get('start_date')], 
-            key=lambda x: x['start_date']
-        )
+            key=lambda x: self.to_local_naive(x['start_date'])
+        ) + [e for e in self.events if not e.get('start_date')]
         
         html_content = f"""<!DOCTYPE html>
 <html lang="fi">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>📅 Jyväskylän Tapahtumakalenteri</title>
+    <title>📅 {self.calendar_name}</title>
     <meta name="description" content="Tilaa Jyväskylän tapahtumat suoraan omaan kalenteriisi. Päivittyy automaattisesti!">
     
     <style>
@@ -629,7 +1165,7 @@ class GitHubCalendarGenerator:
 <body>
     <div class="container">
         <div class="header">
-            <h1>📅 Jyväskylän Tapahtumakalenteri</h1>
+            <h1>📅 {self.calendar_name}</h1>
             <p>Tilaa kalenteri ja pysy ajan tasalla Jyväskylän tapahtumista!</p>
             <p>🔄 Päivittyy automaattisesti GitHub Actionseilla</p>
         </div>
@@ -723,10 +1259,185 @@ class GitHubCalendarGenerator:
         
         return html_content
     
+    def compute_changes(self, previous_events, archived_events=()):
+        """Vertaa nykyisiä tapahtumia edelliseen ajoon tunnisteindeksin avulla
+
+        Arkistoon siirtyneitä tapahtumia ei raportoida poistuneina. Muuttuneiksi
+        raportoidaan vain TRACKED_FIELDS-kenttien muutokset; uudelleen nimetty
+        tai siirretty tapahtuma näkyy poistuneena ja uutena.
+        """
+        previous_index = {}
+        for event in previous_events:
+            data = self.serialize_event(event)
+            previous_index[data['id']] = data
+
+        current_index = {}
+        for event in self.events:
+            data = self.serialize_event(event)
+            current_index[data['id']] = data
+
+        archived_ids = {self.event_id(event) for event in archived_events}
+
+        added = [data for event_id, data in current_index.items() if event_id not in previous_index]
+        removed = [data for event_id, data in previous_index.items()
+                   if event_id not in current_index and event_id not in archived_ids]
+
+        modified = []
+        for event_id, data in current_index.items():
+            old = previous_index.get(event_id)
+            if old is None:
+                continue
+            changed_fields = {
+                field: {'old': old.get(field), 'new': data.get(field)}
+                for field in TRACKED_FIELDS
+                if old.get(field) != data.get(field)
+            }
+            if changed_fields:
+                modified.append({'id': event_id, 'event': data, 'changed_fields': changed_fields})
+
+        return {
+            'updated': datetime.now().isoformat(),
+            'summary': {'added': len(added), 'removed': len(removed), 'modified': len(modified)},
+            'added': added,
+            'removed': removed,
+            'modified': modified
+        }
+
+    def save_changes(self, changes):
+        """Tallentaa ajon muutokset sekä liukuvan muutoslokin JSON- ja RSS-muodossa"""
+        with open(os.path.join(self.docs_dir, 'changes.json'), 'w', encoding='utf-8') as f:
+            json.dump(changes, f, ensure_ascii=False, indent=2)
+
+        changelog_path = os.path.join(self.docs_dir, 'changelog.json')
+        try:
+            with open(changelog_path, 'r', encoding='utf-8') as f:
+                runs = json.load(f).get('runs', [])
+        except FileNotFoundError:
+            runs = []
+        except Exception as e:
+            print(f"⚠️ Virhe muutoslokin lukemisessa: {e}")
+            runs = []
+
+        if any(changes['summary'].values()):
+            runs.insert(0, changes)
+            runs = runs[:CHANGELOG_MAX_RUNS]
+
+            with open(changelog_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'updated': changes['updated'],
+                    'runs': runs
+                }, f, ensure_ascii=False, indent=2)
+
+        with open(os.path.join(self.docs_dir, 'changelog.rss'), 'w', encoding='utf-8') as f:
+            f.write(self.generate_changelog_rss(runs))
+
+        summary = changes['summary']
+        print(f"🔀 Muutokset: +{summary['added']} / -{summary['removed']} / ~{summary['modified']}")
+
+    def generate_changelog_rss(self, runs):
+        """Luo RSS 2.0 -syötteen muutoslokin tapahtumamuutoksista"""
+        site_url = self.pages_url()
+
+        items = []
+        for run in runs:
+            pub_date = format_datetime(datetime.fromisoformat(run['updated']).astimezone())
+            entries = (
+                [('added', '➕ Uusi', data, '') for data in run.get('added', [])] +
+                [('modified', '✏️ Muuttunut', change['event'], ', '.join(change['changed_fields']))
+                 for change in run.get('modified', [])] +
+                [('removed', '➖ Poistunut', data, '') for data in run.get('removed', [])]
+            )
+            for kind, label, data, fields in entries:
+                description = f"{data.get('start_date') or 'Aika ei tiedossa'} | {data.get('location', '')}"
+                if fields:
+                    description += f" | Muuttuneet kentät: {fields}"
+                items.append(f"""    <item>
+      <title>{escape(f"{label}: {data['title']}")}</title>
+      <link>{escape(data.get('url') or site_url)}</link>
+      <description>{escape(description)}</description>
+      <guid isPermaLink="false">{escape(f"{data['id']}-{kind}-{run['updated']}")}</guid>
+      <pubDate>{pub_date}</pubDate>
+    </item>""")
+
+        items = items[:CHANGELOG_MAX_RSS_ITEMS]
+
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+  <channel>
+    <title>{escape(self.calendar_name)} - muutokset</title>
+    <link>{escape(site_url)}</link>
+    <description>Lisätyt, poistuneet ja muuttuneet tapahtumat ajoittain</description>
+    <language>fi</language>
+    <lastBuildDate>{format_datetime(datetime.now().astimezone())}</lastBuildDate>
+{chr(10).join(items)}
+  </channel>
+</rss>
+"""
+
+    def pages_url(self):
+        """Palauttaa tämän kalenterin osoitteen GitHub Pages -sivustolla
+
+        Alikansioon (esim. docs/laukaa) generoitu kalenteri saa vastaavan
+        alipolun sivuston juuren alle.
+        """
+        repo_name = os.environ.get('GITHUB_REPOSITORY', 'käyttäjä/jyvaskyla-tapahtumat')
+        username = repo_name.split('/')[0]
+        site_url = f"https://{username}.github.io/jyvaskyla-tapahtumat/"
+
+        subpath = os.path.relpath(self.docs_dir, PAGES_ROOT)
+        if subpath == os.curdir:
+            return site_url
+        return f"{site_url}{subpath.replace(os.sep, '/')}/"
+
+    def save_snapshot(self, path=DEFAULT_SNAPSHOT_PATH):
+        """Tallentaa haetut tapahtumat välimuistitiedostoon render-vaihetta varten"""
+        snapshot_dir = os.path.dirname(path)
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': datetime.now().isoformat(),
+                'count': len(self.events),
+                'filter_stats': self.filter_stats,
+                'events': [self.serialize_event(event) for event in self.events]
+            }, f, ensure_ascii=False, indent=2)
+
+        print(f"💾 Välimuisti tallennettu: {path}")
+
+    def load_snapshot(self, path=DEFAULT_SNAPSHOT_PATH):
+        """Lataa tapahtumat välimuistitiedostosta"""
+        if not os.path.exists(path):
+            print(f"❌ Välimuistia {path} ei löydy - aja ensin fetch-vaihe")
+            return False
+
+        # Rikkinäinen välimuisti ei saa tyhjentää julkaistua kalenteria, joten
+        # virheitä ei niellä kuten load_events_json tekee
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if not isinstance(snapshot, dict) or not isinstance(snapshot.get('events'), list):
+                raise ValueError("'events'-lista puuttuu")
+            events = [self.deserialize_event(event) for event in snapshot['events']]
+        except Exception as e:
+            print(f"❌ Välimuistin {path} lukeminen epäonnistui: {e}")
+            return False
+
+        self.events = events
+        self.filter_stats = snapshot.get('filter_stats', {})
+        print(f"📂 Ladattiin {len(self.events)} tapahtumaa välimuistista ({snapshot.get('created', '?')})")
+        return True
+
     def save_files(self):
         """Tallentaa tiedostot docs-kansioon"""
         self.ensure_docs_dir()
         
+        # Edellinen ajo luetaan ennen kuin events.json ylikirjoitetaan
+        _, previous_events = self.load_events_json(os.path.join(self.docs_dir, 'events.json'))
+        
+        # Karsi vanhat tapahtumat arkistoon
+        archived_events = self.apply_retention(previous_events)
+        
         # Tallenna iCalendar
         ical_content = self.generate_ical()
         with open(os.path.join(self.docs_dir, 'calendar.ics'), 'wb') as f:
@@ -737,16 +1448,11 @@ class GitHubCalendarGenerator:
         with open(os.path.join(self.docs_dir, 'index.html'), 'w', encoding='utf-8') as f:
             f.write(html_content)
         
+        # Muutossyöte edelliseen ajoon nähden
+        self.save_changes(self.compute_changes(previous_events, archived_events))
+        
         # Luo JSON-data (valinnainen, API-käyttöä varten)
-        events_json = [{
-            'title': event['title'],
-            'description': event.get('description', ''),
-            'start_date': event['start_date'].isoformat() if event.get('start_date') else None,
-            'end_date': event['end_date'].isoformat() if event.get('end_date') else None,
-            'location': event.get('location', ''),
-            'url': event.get('url', ''),
-            'source': event.get('source', '')
-        } for event in self.events]
+        events_json = [self.serialize_event(event) for event in self.events]
         
         with open(os.path.join(self.docs_dir, 'events.json'), 'w', encoding='utf-8') as f:
             json.dump({
@@ -755,16 +1461,135 @@ class GitHubCalendarGenerator:
                 'events': events_json
             }, f, ensure_ascii=False, indent=2)
         
+        # Suodattimien osumatilastot meluisten valitsimien tunnistamiseen
+        with open(os.path.join(self.docs_dir, 'filter_stats.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'updated': datetime.now().isoformat(),
+                'sources': self.filter_stats
+            }, f, ensure_ascii=False, indent=2)
+        
         print(f"✅ Tiedostot tallennettu {self.docs_dir}/ kansioon")
         print(f"   📄 index.html")
         print(f"   📅 calendar.ics")
         print(f"   📊 events.json")
+        print(f"   🔀 changes.json, changelog.json, changelog.rss")
+        print(f"   🚫 filter_stats.json")
+
+def run_batch(batch_config_path=DEFAULT_BATCH_CONFIG_PATH):
+    """Generoi useita kalentereita yhdessä prosessissa jaetulla lähdevälimuistilla
+
+    Jokainen eri URL haetaan ja parsitaan vain kerran, ja jokainen kalenteri
+    kirjoitetaan omaan tuloskansioonsa.
+    """
+    try:
+        with open(batch_config_path, 'r', encoding='utf-8') as f:
+            calendars = json.load(f).get('calendars', [])
+    except Exception as e:
+        print(f"❌ Eräajon konfiguraation {batch_config_path} lataaminen epäonnistui: {e}")
+        return 1
+
+    # Tarkista kaikki kalenterit ennen hakuja, jotta virheellinen kohta ei
+    # tuota oletuskonfiguraatiolla väärää kalenteria eikä kaada koko ajoa
+    valid_calendars = []
+    failed = 0
+    used_docs_dirs = set()
+    for index, calendar in enumerate(calendars):
+        error = validate_batch_entry(calendar, used_docs_dirs)
+        if error:
+            label = calendar.get('name', f'#{index + 1}') if isinstance(calendar, dict) else f'#{index + 1}'
+            print(f"❌ Kalenteri {label} ohitetaan: {error}")
+            failed += 1
+        else:
+            valid_calendars.append(calendar)
+
+    sources = SourceCache()
+    for calendar in valid_calendars:
+        name = calendar['name']
+        print(f"\n📦 Kalenteri: {name}")
+
+        try:
+            generator = GitHubCalendarGenerator(
+                config_path=calendar['config'],
+                docs_dir=calendar['docs_dir'],
+                sources=sources,
+                calendar_name=calendar.get('title') or name
+            )
+            generator.fetch_events_from_sources()
+            generator.save_files()
+        except Exception as e:
+            print(f"❌ Kalenterin {name} generointi epäonnistui: {e}")
+            failed += 1
+
+    print(f"\n🎉 {len(calendars) - failed}/{len(calendars)} kalenteria generoitu, "
+          f"haettiin {len(sources.responses)} eri URL-osoitetta")
+    return 1 if failed else 0
+
+def validate_batch_entry(calendar, used_docs_dirs):
+    """Tarkistaa eräajon kalenterimäärityksen ja täydentää oletusarvot
+
+    Palauttaa virheilmoituksen tai None, jos määritys on kunnossa.
+    """
+    if not isinstance(calendar, dict):
+        return "määrityksen pitää olla JSON-objekti"
+    if not calendar.get('config'):
+        return "'config' puuttuu"
+    for key in ['config', 'name', 'title', 'docs_dir']:
+        if key in calendar and not isinstance(calendar[key], str):
+            return f"'{key}' pitää olla merkkijono"
+    if 'name' in calendar and not calendar['name'].strip():
+        return "'name' ei voi olla tyhjä"
+    if not os.path.isfile(calendar['config']):
+        return f"konfiguraatiota {calendar['config']} ei löydy"
+    try:
+        with open(calendar['config'], 'r', encoding='utf-8') as f:
+            if not isinstance(json.load(f), dict):
+                return f"konfiguraation {calendar['config']} pitää olla JSON-objekti"
+    except Exception as e:
+        return f"konfiguraation {calendar['config']} lukeminen epäonnistui: {e}"
+
+    calendar.setdefault('name', os.path.splitext(os.path.basename(calendar['config']))[0])
+    calendar.setdefault('docs_dir', os.path.join(PAGES_ROOT, calendar['name']))
+
+    docs_dir = os.path.normpath(calendar['docs_dir'])
+    if os.path.relpath(docs_dir, PAGES_ROOT).startswith(os.pardir):
+        return f"tuloskansion {calendar['docs_dir']} pitää olla {PAGES_ROOT}/-kansion alla"
+    # Sisäkkäiset kansiot kirjoittaisivat toistensa tiedostojen (esim. archive/) päälle
+    for used in used_docs_dirs:
+        if os.path.commonpath([docs_dir, used]) in (docs_dir, used):
+            return f"tuloskansio {calendar['docs_dir']} on päällekkäinen toisen kalenterin kansion {used} kanssa"
+    used_docs_dirs.add(docs_dir)
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jyväskylän tapahtumakalenterin generointi")
+    parser.add_argument('stage', nargs='?', default='all', choices=['fetch', 'render', 'all', 'batch'],
+                        help="fetch = hae tapahtumat, render = luo docs/ välimuistista, all = molemmat, "
+                             "batch = kaikki eräajon kalenterit")
+    parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT_PATH,
+                        help=f"välimuistitiedoston polku (oletus: {DEFAULT_SNAPSHOT_PATH})")
+    parser.add_argument('--batch-config', default=DEFAULT_BATCH_CONFIG_PATH,
+                        help=f"eräajon konfiguraatio (oletus: {DEFAULT_BATCH_CONFIG_PATH})")
+    args = parser.parse_args(argv)
+
+    if args.stage == 'batch':
+        return run_batch(args.batch_config)
 
-if __name__ == "__main__":
     generator = GitHubCalendarGenerator()
-    generator.fetch_events_from_sources()
-    generator.save_files()
-    
-    print("\n🎉 Kalenteri generoitu onnistuneesti!")
-    print("GitHub Pages aktivoituna kalenteri on saatavilla osoitteessa:")
-    print("https://[käyttäjänimi].github.io/[repo-nimi]/calendar.ics")
+
+    if args.stage in ('fetch', 'all'):
+        generator.fetch_events_from_sources()
+        generator.save_snapshot(args.snapshot)
+    elif not generator.load_snapshot(args.snapshot):
+        return 1
+
+    if args.stage in ('render', 'all'):
+        generator.save_files()
+
+        print("\n🎉 Kalenteri generoitu onnistuneesti!")
+        print("GitHub Pages aktivoituna kalenteri on saatavilla osoitteessa:")
+        print("https://[käyttäjänimi].github.io/[repo-nimi]/calendar.ics")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())